@@ -26,6 +26,7 @@ DEFAULT_WAIT_SECONDS = 5
 DEFAULT_INCR_SECONDS = 5
 DEFAUL_MAX_WAIT = 20
 DEFAULT_RANDOM_FACTOR = 0.4
+DEFAULT_PAGE_SIZE = 100
 
 ENV_BOTO_RETRIES = "BOTO_RETRY"
 ENV_BOTO_RETRY_LOGGING = "BOTO_RETRY_LOGGING"
@@ -34,6 +35,10 @@ LOG_FORMAT = "{:0>4d}-{:0>2d}-{:0>2d} - {:0>2d}:{:0>2d}:{:0>2d}.{:0>3s} {}, retr
 
 MAX_WAIT = 24 * 3600
 
+# calls made by the paginators used in paginate are not wrapped in the retry logic of this module, clients used for
+# these calls pass this configuration to let botocore retry throttled calls
+PAGINATE_RETRY_CONFIG = botocore.config.Config(retries={"mode": "standard", "max_attempts": 10})
+
 boto_retry_debug = str(os.getenv(ENV_BOTO_RETRY_LOGGING, "false")).lower() == "true"
 
 
@@ -128,7 +133,7 @@ def _get_service_retry_strategy_class(service):
 
 
 def get_client_with_retries(service_name, methods, context=None, region=None, session=None, wait_strategy=None,
-                            method_suffix=DEFAULT_SUFFIX):
+                            method_suffix=DEFAULT_SUFFIX, config=None):
     """
     Creates a bot3 client for the specified service name and region. The return client will have additional method for the
     specified methods that are wrapped with the logic of the specified wait strategy or the default strategy for that service.
@@ -141,6 +146,7 @@ def get_client_with_retries(service_name, methods, context=None, region=None, se
     :param session: Boto3 session, if None a new session will be created
     :param wait_strategy: WaitStrategy to use for the added methods, if None the default strategy will be used for the service
     :param method_suffix: Suffix to add to the methods with retry logic that are added to the client, use none for DEFAULT_SUFFIX
+    :param config: Optional botocore client configuration, e.g. to set connection pool size or retry mode
     :return: Client for the service with additional method that use retry logic
     """
     args = {
@@ -153,7 +159,10 @@ def get_client_with_retries(service_name, methods, context=None, region=None, se
     user_agent = os.getenv("USER_AGENT", None)
     if user_agent is not None:
         session_config = botocore.config.Config(user_agent=user_agent)
-        args["config"] = session_config
+        config = session_config.merge(config) if config is not None else session_config
+
+    if config is not None:
+        args["config"] = config
 
     aws_session = session if session is not None else boto3.Session()
 
@@ -171,6 +180,23 @@ def get_client_with_retries(service_name, methods, context=None, region=None, se
     return result
 
 
+def paginate(client, operation, result_key, page_size=DEFAULT_PAGE_SIZE, **kwargs):
+    """
+    Iterates over the items returned by a paged boto3 operation, using the paginator of the client to handle the
+    continuation tokens of the service
+    :param client: Boto3 client
+    :param operation: Name of the paged boto3 operation
+    :param result_key: Name of the list in a response page that holds the returned items
+    :param page_size: Max number of items requested per call
+    :param kwargs: Operation parameters
+    :return: Iterator over the items of all pages
+    """
+    paginator = client.get_paginator(operation)
+    for page in paginator.paginate(PaginationConfig={"PageSize": page_size}, **kwargs):
+        for item in page.get(result_key, []):
+            yield item
+
+
 def add_retry_methods_to_resource(resource, methods, context=None, method_suffix=DEFAULT_SUFFIX):
     """
     Adds new methods to a boto3 resource that wrap the original methods with retry logic.
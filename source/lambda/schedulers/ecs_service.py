@@ -11,20 +11,32 @@
 #  and limitations under the License.                                                                                #
 ######################################################################################################################
 
-import copy
+import asyncio
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
+
+import botocore.config
+
+try:
+    import aioboto3
+    from aiobotocore.config import AioConfig
+except ImportError:
+    aioboto3 = None
+    AioConfig = None
 
 import schedulers
-import re
-import copy
 
-from boto_retry import get_client_with_retries
+from boto_retry import get_client_with_retries, paginate, DEFAULT_PAGE_SIZE, PAGINATE_RETRY_CONFIG
 from configuration.instance_schedule import InstanceSchedule
 from configuration.running_period import RunningPeriod
 from configuration.scheduler_config_builder import SchedulerConfigBuilder
 from configuration.setbuilders.weekday_setbuilder import WeekdaySetBuilder
 
 RESTRICTED_ECS_TAG_VALUE_SET_CHARACTERS = r"[^a-zA-Z0-9\s_\.:+/=\\@-]"
+# newlines are matched by \s in the allowed set, so they are added to be replaced in the same pass
+_RESTRICTED_ECS_TAG_VALUE_RE = re.compile(RESTRICTED_ECS_TAG_VALUE_SET_CHARACTERS + r"|\n")
 
 ERR_STARTING_INSTANCE = "Error starting ecs {} {} ({})"
 ERR_STOPPING_INSTANCE = "Error stopping ecs {} {}, ({})"
@@ -52,13 +64,55 @@ WARN_ECS_TAG_VALUE = "Tag value \"{}\" for tag \"{}\" changed to \"{}\" because
                     "in ECS tag values. The value can only contain only the set of Unicode letters, digits, " \
                      "white-space, '_', '.', '/', '=', '+', '-'"
 
+_TAG_KEY_VALUE = itemgetter("key", "value")
+
+# tag holding the desired count of a stopped service, used to restore the desired count when the service is started
+TAG_LAST_DESIRED_COUNT = "ScheduledLastDesiredCount"
+
+MAX_FETCH_WORKERS = 10
+MAX_UPDATE_WORKERS = 16
+# size of the single pool describing batches of clusters and services for all clusters in a region
+MAX_DESCRIBE_WORKERS = 8
+
+# max number of resources that can be passed to a single describe_services and describe_clusters call
+DESCRIBE_SERVICES_BATCH_SIZE = 10
+DESCRIBE_CLUSTERS_BATCH_SIZE = 100
+
+ECS_CONNECT_TIMEOUT = 5
+ECS_READ_TIMEOUT = 30
+
+# max number of attempts of a call, including the first attempt
+ECS_MAX_ATTEMPTS = 10
+
+# botocore is the only retry layer for ecs calls, the client has no retry methods of boto_retry that would retry the
+# calls again after the attempts of botocore are used. The adaptive retry mode rate limits the client when calls are
+# throttled, as the client is shared by the threads fetching and updating services this limits the calls of all these
+# threads. The connection pool is sized for the max number of concurrent calls, made by the cluster fetch workers plus
+# the shared describe workers, or by the update workers.
+ECS_CLIENT_CONFIG = botocore.config.Config(max_pool_connections=max(MAX_FETCH_WORKERS + MAX_DESCRIBE_WORKERS,
+                                                                    MAX_UPDATE_WORKERS),
+                                           retries={"mode": "adaptive", "total_max_attempts": ECS_MAX_ATTEMPTS},
+                                           connect_timeout=ECS_CONNECT_TIMEOUT,
+                                           read_timeout=ECS_READ_TIMEOUT)
+
+# services are fetched with aioboto3 if this variable is set to true, aioboto3 is not included in the requirements of
+# the scheduler and must be added to the deployment package
+ENV_ECS_ASYNC_FETCH = "ECS_ASYNC_FETCH"
+MAX_ASYNC_FETCH_CONCURRENCY = 16
+
 MAINTENANCE_SCHEDULE_NAME = "ECS preferred Maintenance Window Schedule"
 MAINTENANCE_PERIOD_NAME = "ECS preferred Maintenance Window Period"
 
 
+def _chunks(seq, n):
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+
 class EcsService:
     ECS_STATE_AVAILABLE = "ACTIVE"
     ECS_STATE_STOPPED = "stopped"
+    ECS_STATE_INACTIVE = "INACTIVE"
 
     ECS_SCHEDULABLE_STATES = {ECS_STATE_AVAILABLE, ECS_STATE_STOPPED}
 
@@ -75,6 +129,12 @@ class EcsService:
         self._tagname = None
         self._stack_name = None
         self._config = None
+        self._ecs = None
+        self._describe_executor = None
+        self._start_tags = []
+        self._stop_tags = []
+        self._start_tags_keys = []
+        self._stop_tags_keys = []
 
     def _init_scheduler(self, args):
         
@@ -93,7 +153,12 @@ class EcsService:
         self._tagname = args.get(schedulers.PARAM_CONFIG).tag_name
         self._config = args.get(schedulers.PARAM_CONFIG)
         self._instance_tags = None
-
+        # single client for all ecs calls in the region, it is created here as creating clients from a shared session
+        # is not thread safe and the client is used by the threads fetching and updating services. No retry methods
+        # are added, these share a single wait strategy between all calls of the client and would reset and advance
+        # the waits of calls made in other threads, the calls are retried by botocore as set in ECS_CLIENT_CONFIG.
+        self._ecs = get_client_with_retries("ecs", [], context=self._context, session=self._session,
+                                            region=self._region, config=ECS_CLIENT_CONFIG)
 
     @staticmethod
     def build_schedule_from_maintenance_window(period_str):
@@ -154,84 +219,198 @@ class EcsService:
     # get services and handle paging
     def get_schedulable_instances(self, kwargs):
         self._init_scheduler(kwargs)
-        self._session = kwargs[schedulers.PARAM_SESSION]
-        context = kwargs[schedulers.PARAM_CONTEXT]
         region = kwargs[schedulers.PARAM_REGION]
-        account = kwargs[schedulers.PARAM_ACCOUNT]
-        self._logger = kwargs[schedulers.PARAM_LOGGER]
-        tagname = kwargs[schedulers.PARAM_CONFIG].tag_name
-        config = kwargs[schedulers.PARAM_CONFIG]
-        mixed_clusters = []
-        mixed_services = []
-        services = []
-        mixed_clusters =  self.get_schedulable_ecs_clusters(context, region)
-
-        if mixed_clusters['clusters_without_schedule']:
-            for cluster in mixed_clusters['clusters_without_schedule']:
-                services = self.get_schedulable_ecs_services(cluster, context, region)
-                # services = mixed_services['services_with_schedule']
-                # for no_tag_service in mixed_services['services_without_schedule']:
-                #     no_tag_service['ecs_service_force_stop'] = True
-                #     services = services.extend(no_tag_service)
-                
-                    
 
+        # single pool for the describe calls of all clusters, bounding the number of concurrent calls on the client
+        with ThreadPoolExecutor(max_workers=MAX_DESCRIBE_WORKERS) as describe_executor:
+            self._describe_executor = describe_executor
+            try:
+                return self._get_schedulable_services(region)
+            finally:
+                self._describe_executor = None
+
+    def _get_schedulable_services(self, region):
+        mixed_clusters = self.get_schedulable_ecs_clusters()
+        if not mixed_clusters['clusters_without_schedule'] and not mixed_clusters['clusters_with_schedule']:
+            return []
+
+        # services without a schedule tag in clusters with a schedule tag are not scheduled, the tagged services of
+        # these clusters are taken from the tagging api instead of listing all services of the clusters
+        tagged_services = {}
         if mixed_clusters['clusters_with_schedule']:
-            for cluster in mixed_clusters['clusters_with_schedule'] :
-                #fetch all mixed_services
-                services.extend(self.get_all_services(cluster, context, region))
-            
+            tagged_services = self._services_by_cluster(self.get_tagged_ecs_services(region))
+
+        if self._async_fetch_enabled():
+            return asyncio.run(self._afetch_services(mixed_clusters, tagged_services))
+
+        # services are fetched in parallel for all clusters, the boto3 calls release the GIL while waiting for responses
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+            fetched = list(executor.map(lambda c: self.get_schedulable_ecs_services(c),
+                                        mixed_clusters['clusters_without_schedule']))
+            fetched += list(executor.map(lambda c: self.get_all_services(c, tagged_services.get(c, {})),
+                                         mixed_clusters['clusters_with_schedule']))
+
+        services = []
+        for cluster_services in fetched:
+            services.extend(cluster_services)
 
         return services
         
-    def get_schedulable_ecs_clusters(self, context, region):
-        
-        client = get_client_with_retries("ecs", ["list_clusters"], context=context, session=self._session,
-                                         region=region)
-        
-        args = {}
-        clusters = []
-        done = False
-
-        while not done:
-            ecs_cluster_resp = client.list_clusters_with_retries(**args)
-            
-            clusters.extend(ecs_cluster_resp['clusterArns'])
-            
-            if "NextToken" in ecs_cluster_resp:
-                args["NextToken"] = ecs_cluster_resp["NextToken"]
-            else:
-                done = True
-        
-        mixed_clusters = self._validate_cluster_tag_values(clusters, context, region)
+    @staticmethod
+    def _async_fetch_enabled():
+        return aioboto3 is not None and str(os.getenv(ENV_ECS_ASYNC_FETCH, "false")).lower() == "true"
+
+    async def _afetch_services(self, mixed_clusters, tagged_services):
+        """
+        Fetches the services of all clusters concurrently using a single aioboto3 client for the region
+        :param mixed_clusters: clusters with and without a schedule tag
+        :param tagged_services: tags of the services with a schedule tag, by cluster name and service arn
+        :return: list of service data
+        """
+        credentials = self._session.get_credentials().get_frozen_credentials() if self._session is not None else None
+        if credentials is not None:
+            session = aioboto3.Session(aws_access_key_id=credentials.access_key,
+                                       aws_secret_access_key=credentials.secret_key,
+                                       aws_session_token=credentials.token)
+        else:
+            session = aioboto3.Session()
+
+        config = AioConfig(max_pool_connections=MAX_ASYNC_FETCH_CONCURRENCY,
+                           retries={"mode": "standard", "total_max_attempts": ECS_MAX_ATTEMPTS},
+                           connect_timeout=ECS_CONNECT_TIMEOUT,
+                           read_timeout=ECS_READ_TIMEOUT,
+                           user_agent=os.getenv("USER_AGENT", None))
+        semaphore = asyncio.Semaphore(MAX_ASYNC_FETCH_CONCURRENCY)
+
+        async with session.client("ecs", region_name=self._region, config=config) as client:
+            fetched = await asyncio.gather(
+                *[self._afetch_cluster(client, c, semaphore)
+                  for c in mixed_clusters['clusters_without_schedule']],
+                *[self._afetch_cluster(client, c, semaphore, tagged_services.get(c, {}))
+                  for c in mixed_clusters['clusters_with_schedule']])
+
+        return [service for cluster_services in fetched for service in cluster_services]
+
+    async def _afetch_cluster(self, client, cluster, semaphore, tagged_services=None):
+        """
+        Fetches the services of a cluster, the described services are selected in the same way as by the threaded fetch
+        :param client: aioboto3 ecs client
+        :param cluster: name of the cluster
+        :param semaphore: semaphore limiting the number of concurrent calls
+        :param tagged_services: if set, only these services are described instead of all services of the cluster
+        :return: list of service data
+        """
+
+        async def describe_batch(batch):
+            args = {"cluster": cluster, "services": batch}
+            if tagged_services is None:
+                args["include"] = ['TAGS']
+            async with semaphore:
+                resp = await client.describe_services(**args)
+            return resp["services"]
+
+        if tagged_services is not None:
+            services = list(tagged_services)
+        else:
+            services = []
+            async with semaphore:
+                paginator = client.get_paginator("list_services")
+                async for page in paginator.paginate(cluster=cluster,
+                                                     PaginationConfig={"PageSize": DEFAULT_PAGE_SIZE}):
+                    services.extend(page.get("serviceArns", []))
+
+        described = await asyncio.gather(*[describe_batch(b) for b in _chunks(services, DESCRIBE_SERVICES_BATCH_SIZE)])
+        described = [service for batch in described for service in batch]
+
+        if tagged_services is not None:
+            return self._select_tagged_services(described, tagged_services)
+        return self._validate_service_tag_values(described)
+
+    def get_tagged_ecs_services(self, region):
+        """
+        Gets the tags of the ecs services that have a schedule tag
+        :param region: region of the services
+        :return: tags in ecs format by service arn
+        """
+        tag_client = get_client_with_retries("resourcegroupstaggingapi", methods=[], session=self._session,
+                                             context=self._context, region=region, config=PAGINATE_RETRY_CONFIG)
+
+        args = {
+            "TagFilters": [{"Key": self._tagname}],
+            "ResourceTypeFilters": ["ecs:service"]
+        }
+
+        services = {}
+        for resource in paginate(tag_client, "get_resources", "ResourceTagMappingList", **args):
+            services[resource["ResourceARN"]] = [{"key": tag["Key"], "value": tag["Value"]}
+                                                 for tag in resource.get("Tags", [])]
+        return services
+
+    @staticmethod
+    def _services_by_cluster(services):
+        """
+        Groups services by the cluster name in their arn, arn:aws:ecs:region:account:service/cluster/service. Services
+        that can be tagged always use this arn format.
+        :param services: dictionary with service arns as keys
+        :return: services by cluster name
+        """
+        result = {}
+        for arn in services:
+            resource = arn.split(":", 5)[-1].split("/")
+            if len(resource) == 3:
+                result.setdefault(resource[1], {})[arn] = services[arn]
+        return result
+
+    def get_schedulable_ecs_clusters(self):
+
+        clusters = list(paginate(self._ecs, "list_clusters", "clusterArns"))
+
+        mixed_clusters = self._validate_cluster_tag_values(clusters)
         # self._logger.info(INF_FETCHED_CLUSTERS, , len(clusters), mixed_clusters)
         return mixed_clusters
-    
-    
-    def _validate_cluster_tag_values(self, clusters, context, region):
-        client = get_client_with_retries("ecs", ["describe_clusters"], context=context, session=self._session,
-                                         region=region)
-        args = {"clusters":clusters,"include":['TAGS']}
+
+    def _validate_cluster_tag_values(self, clusters):
         mixed_clusters = { "clusters_with_schedule" : [], "clusters_without_schedule" : []}
-        done = False
-        
-        while not done:
-            ecs_response = client.describe_clusters_with_retries(**args)
-            for cluster_data in ecs_response['clusters']:
-                is_cluster_scheduled = self._filter_resource_based_on_tags(cluster_data)
-                if is_cluster_scheduled:
-                    mixed_clusters['clusters_with_schedule'].append(cluster_data.get('clusterName'))
-                else :
-                    mixed_clusters['clusters_without_schedule'].append(cluster_data.get('clusterName'))
-            if "NextToken" in ecs_response:
-                args["NextToken"] = ecs_response["NextToken"]
-            else:
-                done = True
-        
+
+        for cluster_data in self._describe_in_batches(self._ecs.describe_clusters, "clusters", clusters,
+                                                      DESCRIBE_CLUSTERS_BATCH_SIZE, include=['TAGS']):
+            is_cluster_scheduled = self._filter_resource_based_on_tags(cluster_data)
+            if is_cluster_scheduled:
+                mixed_clusters['clusters_with_schedule'].append(cluster_data.get('clusterName'))
+            else :
+                mixed_clusters['clusters_without_schedule'].append(cluster_data.get('clusterName'))
+
         return mixed_clusters
-            
-    def get_tags(self, inst):
-        return { tag["key"]: tag["value"] for tag in inst["tags"]} if "tags" in inst else {}
+
+    def _describe_in_batches(self, describe_fn, name, arns, batch_size, **kwargs):
+        """
+        Describes resources in batches of the max number of resources accepted by the describe call, the batches
+        are described in parallel by the shared describe pool. A single batch, or all batches if there is no pool, are
+        described in the calling thread.
+        :param describe_fn: describe method of the client
+        :param name: name of the parameter holding the resources, which is also the name of the list in the response
+        :param arns: names or arns of the resources to describe
+        :param batch_size: max number of resources per describe call
+        :param kwargs: additional parameters for the describe call
+        :return: list of described resources
+        """
+        batches = list(_chunks(arns, batch_size))
+
+        def describe_batch(batch):
+            args = {name: batch}
+            args.update(kwargs)
+            return describe_fn(**args)[name]
+
+        if self._describe_executor is None or len(batches) < 2:
+            described = map(describe_batch, batches)
+        else:
+            described = self._describe_executor.map(describe_batch, batches)
+
+        return [resource for batch in described for resource in batch]
+
+    @staticmethod
+    def get_tags(inst):
+        return dict(map(_TAG_KEY_VALUE, inst.get("tags", ())))
     
     def _filter_resource_based_on_tags(self, ecs_resource):
         tags = self.get_tags(ecs_resource)
@@ -240,122 +419,102 @@ class EcsService:
             return False
         return True
     
-    def get_schedulable_ecs_services(self, cluster, context, region):
-   
-        client = get_client_with_retries("ecs", ["list_services"], context=context, session=self._session,
-                                         region=region)
-        
-        args = {"cluster": cluster}
-        services = []
-        done = False
-        #aws ecs describe-clusters --cluster test-cluster --include TAGS
-        
-        while not done:
-            ecs_service_resp = client.list_services_with_retries(**args)
-            
-            services.extend(ecs_service_resp['serviceArns'])
-            
-            if "NextToken" in ecs_service_resp:
-                args["NextToken"] = ecs_service_resp["NextToken"]
-            else:
-                done = True
+    def get_schedulable_ecs_services(self, cluster):
 
-        all_services = self._validate_service_tag_values(services, cluster, context, region)
+        described = self._list_and_describe_services(cluster)
+
+        all_services = self._validate_service_tag_values(described)
 
         # self._logger.info(INF_FETCHED_CLUSTERS, , len(clusters), clusters_with_schedule)
         return all_services
-    
-    def _validate_service_tag_values(self, services, cluster, context, region):
-        client = get_client_with_retries("ecs", ["describe_services"], context=context, session=self._session,
-                                         region=region)
-        args = {"cluster": cluster ,"services":services, "include":['TAGS']}
-        mixed_services = { "services_with_schedule" : [], "services_without_schedule" : []}
-        all_services = []
-        # no_tag_services = []
-        done = False
-        # tag_name = "Schedule"
-        while not done:
-            ecs_response = client.describe_services_with_retries(**args)
-            for service_data in ecs_response['services']:
-                is_service_scheduled = self._filter_resource_based_on_tags(service_data)
-                # data = self._select_resource_data(service_data)
-                if is_service_scheduled:
-                    data = self._select_resource_data(service_data)
-                    all_services.append(data)
-                else:
-                    data = self._select_resource_data(service_data, True)
-                    all_services.append(data)
-
-            if "NextToken" in ecs_response:
-                args["NextToken"] = ecs_response["NextToken"]
-            else:
-                done = True
-        
-        return all_services
-    
-    
-    def get_all_services(self, cluster, context, region):
-        #fetch service lists
-        
-        client = get_client_with_retries("ecs", ["list_services"], context=context, session=self._session,
-                                         region=region)
-        
-        args = {"cluster": cluster}
-        services = []
-        done = False
-        
-        while not done:
-            ecs_service_resp = client.list_services_with_retries(**args)
-            
-            services.extend(ecs_service_resp['serviceArns'])
-            
-            if "NextToken" in ecs_service_resp:
-                args["NextToken"] = ecs_service_resp["NextToken"]
-            else:
-                done = True
-        client = get_client_with_retries("ecs", ["describe_services"], context=context, session=self._session,
-                                         region=region)
-        args = {"cluster": cluster ,"services":services, "include":['TAGS']}
+
+    def _list_and_describe_services(self, cluster):
+        """
+        Lists and describes all services of a cluster, the services of a listed page are described while the next
+        page is listed
+        :param cluster: name of the cluster
+        :return: list of described services
+        """
+
+        def describe_batch(batch):
+            return self._ecs.describe_services(cluster=cluster, services=batch, include=['TAGS'])["services"]
+
+        described = []
+        futures = []
+        # a listed batch is submitted to the shared describe pool when the next batch is listed, the last batch, which
+        # is the only batch for most clusters, is described in this thread
+        pending = None
+        paginator = self._ecs.get_paginator("list_services")
+        for page in paginator.paginate(cluster=cluster, PaginationConfig={"PageSize": DEFAULT_PAGE_SIZE}):
+            for batch in _chunks(page.get("serviceArns", []), DESCRIBE_SERVICES_BATCH_SIZE):
+                if pending is not None:
+                    if self._describe_executor is None:
+                        described += describe_batch(pending)
+                    else:
+                        futures.append(self._describe_executor.submit(describe_batch, pending))
+                pending = batch
+
+        if pending is not None:
+            described += describe_batch(pending)
+
+        for future in as_completed(futures):
+            described += future.result()
+
+        return described
+
+    def _validate_service_tag_values(self, described):
         all_services = []
-        done = False
-        while not done:
-            ecs_response = client.describe_services_with_retries(**args)
-            for service_data in ecs_response['services']:
+        for service_data in described:
+            is_service_scheduled = self._filter_resource_based_on_tags(service_data)
+            if is_service_scheduled:
                 data = self._select_resource_data(service_data)
                 all_services.append(data)
-
-            if "NextToken" in ecs_response:
-                args["NextToken"] = ecs_response["NextToken"]
             else:
-                done = True
-        
+                data = self._select_resource_data(service_data, True)
+                all_services.append(data)
+
+        return all_services
+
+    def get_all_services(self, cluster, tagged_services):
+        """
+        Gets the services with a schedule tag in a cluster that has a schedule tag
+        :param cluster: name of the cluster
+        :param tagged_services: tags of the services with a schedule tag in the cluster by service arn
+        :return: list of service data
+        """
+        # tags are already known, only the state and counts of the services are described
+        described = self._describe_in_batches(self._ecs.describe_services, "services",
+                                              list(tagged_services), DESCRIBE_SERVICES_BATCH_SIZE, cluster=cluster)
+        return self._select_tagged_services(described, tagged_services)
+
+    def _select_tagged_services(self, described, tagged_services):
+        all_services = []
+        for service_data in described:
+            # the tagging api can still return services that have been deleted
+            if service_data["status"] == EcsService.ECS_STATE_INACTIVE:
+                continue
+            service_data["tags"] = tagged_services.get(service_data["serviceArn"], [])
+            all_services.append(self._select_resource_data(service_data))
         return all_services
 
     def _select_resource_data(self, ecs_resource, tag_service_having_no_tag = False):
-        
-        def get_tags(inst):
-            return {tag["key"]: tag["value"] for tag in inst["tags"]} if "tags" in inst else {}
 
-        tags = get_tags(ecs_resource)
-        
-        state = ecs_resource["status"]
-        state_name = "running"
-        is_running = ecs_resource['runningCount']>0
-        launch_type = ecs_resource['launchType']
+        tags = self.get_tags(ecs_resource)
+        is_running = ecs_resource['runningCount'] > 0
+
         instance_data = {
             schedulers.INST_ID: ecs_resource["serviceArn"],
-            schedulers.INST_ARN:  ecs_resource["serviceArn"],
-            schedulers.INST_CLUSTER_ARN:  ecs_resource["clusterArn"],
+            schedulers.INST_ARN: ecs_resource["serviceArn"],
+            schedulers.INST_CLUSTER_ARN: ecs_resource["clusterArn"],
             schedulers.INST_ALLOW_RESIZE: self.allow_resize,
             schedulers.INST_HIBERNATE: False,
-            schedulers.INST_STATE: state,
-            schedulers.INST_STATE_NAME: state_name,
+            schedulers.INST_STATE: ecs_resource["status"],
+            schedulers.INST_STATE_NAME: "running",
             schedulers.INST_IS_RUNNING: is_running,
             schedulers.INST_IS_TERMINATED: False,
             schedulers.INST_CURRENT_STATE: InstanceSchedule.STATE_RUNNING if is_running else InstanceSchedule.STATE_STOPPED,
-            schedulers.INST_INSTANCE_TYPE: launch_type,
+            schedulers.INST_INSTANCE_TYPE: ecs_resource['launchType'],
             schedulers.INST_SERVICE_STOP_TAG: tag_service_having_no_tag,
-            # schedulers.INST_ENGINE_TYPE: rds_resource["Engine"],
             schedulers.INST_MAINTENANCE_WINDOW: None,
             schedulers.INST_TAGS: tags,
             schedulers.INST_NAME: tags.get("Name", ""),
@@ -363,136 +522,114 @@ class EcsService:
             schedulers.INST_RUNNING_COUNT: ecs_resource['runningCount'],
             schedulers.INST_DESIRED_COUNT: ecs_resource['desiredCount']
         }
-        
+
         return instance_data
 
     def resize_instance(self, kwargs):
         pass
 
     def _validate_ecs_tag_values(self, tags):
-        result = copy.deepcopy(tags)
+        result = [dict(t) for t in tags]
+        sub = _RESTRICTED_ECS_TAG_VALUE_RE.sub
         for t in result:
             original_value = t.get("value", "")
-            value = re.sub(RESTRICTED_ECS_TAG_VALUE_SET_CHARACTERS, " ", original_value)
-            value = value.replace("\n", " ")
+            value = sub(" ", original_value)
             if value != original_value:
                 self._logger.warning(WARN_ECS_TAG_VALUE, original_value, t, value)
                 t["value"] = value
         return result
 
 
-    def _tag_stopped_resource(self, client, ecs_resource):
-        stop_tags = self._validate_ecs_tag_values(self._config.stopped_tags)
-        started_tags = self._config.started_tags
+    def _init_tags(self):
+        """
+        Validates the configured start and stop tags and determines the keys to remove, done once before the tagging
+        of the started or stopped services
+        :return:
+        """
+        # ecs uses lowercase tag keys, the tags in the configuration are shared with the other services and not changed
+        self._start_tags = self._validate_ecs_tag_values(
+            [{"key": t["Key"], "value": t["Value"]} for t in self._config.started_tags])
+        self._stop_tags = self._validate_ecs_tag_values(
+            [{"key": t["Key"], "value": t["Value"]} for t in self._config.stopped_tags])
+
+        # tag_resource overwrites the values of existing keys, only keys that are not set again have to be removed
+        stop_tags_key_names = {t["key"] for t in self._stop_tags} | {TAG_LAST_DESIRED_COUNT}
+        start_tags_key_names = {t["key"] for t in self._start_tags}
+        self._start_tags_keys = [t["key"] for t in self._start_tags if t["key"] not in stop_tags_key_names]
+        self._stop_tags_keys = [t["key"] for t in self._stop_tags if t["key"] not in start_tags_key_names]
 
-        for t in stop_tags:
-            if 'Key' in t and 'Value' in t:
-                t['key'] = t.pop('Key')
-                t['value'] = t.pop('Value')
-        
-        if len(started_tags) > 0:
-            for t in started_tags:
-                if 'Key' in t and 'Value' in t:
-                    t['key'] = t.pop('Key')
-                    t['value'] = t.pop('Value')
-            
-        stop_tags.append({'key': 'ScheduledLastDesiredCount', 'value': str(ecs_resource.desired_count)})
-            
-        if stop_tags is None:
-            stop_tags = []
-        stop_tags_key_names = [t["key"] for t in stop_tags]
-        start_tags_keys = [t["key"] for t in started_tags if t["key"] not in stop_tags_key_names]
+    def _tag_stopped_resource(self, ecs_resource):
+        stop_tags = self._stop_tags + [{"key": TAG_LAST_DESIRED_COUNT, "value": str(ecs_resource.desired_count)}]
 
         try:
-            if start_tags_keys is not None and len(start_tags_keys):
-                self._logger.info(INF_REMOVE_KEYS, "start",
-                                  ",".join(["\"{}\"".format(k) for k in start_tags_keys]), ecs_resource.arn)
-                client.untag_resource_with_retries(resourceArn=ecs_resource.arn, tags=start_tags_keys)
-            if len(stop_tags) > 0:
-                self._logger.info(INF_ADD_TAGS, "stop", str(stop_tags), ecs_resource.arn)
-
-                client.tag_resource_with_retries(resourceArn=ecs_resource.arn, tags=stop_tags)
+            if len(self._start_tags_keys) > 0:
+                self._logger.info(INF_REMOVE_KEYS, "start", self._start_tags_keys, ecs_resource.arn)
+                self._ecs.untag_resource(resourceArn=ecs_resource.arn, tagKeys=self._start_tags_keys)
+            self._logger.info(INF_ADD_TAGS, "stop", stop_tags, ecs_resource.arn)
+            self._ecs.tag_resource(resourceArn=ecs_resource.arn, tags=stop_tags)
         except Exception as ex:
             self._logger.warning(WARN_TAGGING_STOPPED, ecs_resource.id, str(ex))
 
-    def _tag_started_instances(self, client, ecs_resource):
-        
-        start_tags = self._validate_ecs_tag_values(self._config.started_tags)
-        stopped_tags = self._config.stopped_tags
-        for t in start_tags:
-            if 'Key' in t and 'Value' in t:
-                t['key'] = t.pop('Key')
-                t['value'] = t.pop('Value')
-        
-        if start_tags is None:
-            start_tags = []
-        
-        if len(stopped_tags) > 0:    
-            for t in stopped_tags:
-                if 'Key' in t and 'Value' in t:
-                    t['key'] = t.pop('Key')
-                    t['value'] = t.pop('Value')
-            
-        start_tags_key_names = [t["key"] for t in start_tags]
-
-        stop_tags_keys = [t["key"] for t in stopped_tags if t["key"] not in start_tags_key_names]
+    def _tag_started_instances(self, ecs_resource):
+
         try:
-            if stop_tags_keys is not None and len(stop_tags_keys):
-                self._logger.info(INF_REMOVE_KEYS, "stop",
-                                  ",".join(["\"{}\"".format(k) for k in stop_tags_keys]), ecs_resource.arn)
-                client.untag_resource_with_retries(resourceArn=ecs_resource.arn, tags=stop_tags_keys)
-            if start_tags is not None and len(start_tags) > 0:
-                self._logger.info(INF_ADD_TAGS, "start", str(start_tags), ecs_resource.arn)
-                client.tag_resource_with_retries(resourceArn=ecs_resource.arn, tags=start_tags)
+            if len(self._stop_tags_keys) > 0:
+                self._logger.info(INF_REMOVE_KEYS, "stop", self._stop_tags_keys, ecs_resource.arn)
+                self._ecs.untag_resource(resourceArn=ecs_resource.arn, tagKeys=self._stop_tags_keys)
+            if len(self._start_tags) > 0:
+                self._logger.info(INF_ADD_TAGS, "start", self._start_tags, ecs_resource.arn)
+                self._ecs.tag_resource(resourceArn=ecs_resource.arn, tags=self._start_tags)
         except Exception as ex:
             self._logger.warning(WARN_TAGGING_STARTED, ecs_resource.id, str(ex))
 
+    def _stop_service(self, ecs_resource):
+        self._ecs.update_service(cluster=ecs_resource.cluster_arn, service=ecs_resource.arn, desiredCount=0)
+        self._tag_stopped_resource(ecs_resource)
+
+    def _start_service(self, ecs_resource):
+        self._ecs.update_service(cluster=ecs_resource.cluster_arn, service=ecs_resource.arn,
+                                 desiredCount=int(ecs_resource.tags[TAG_LAST_DESIRED_COUNT]))
+        self._tag_started_instances(ecs_resource)
+
+    def _update_services(self, fn_update, ecs_resources, state, error_message):
+        """
+        Updates services in parallel, a failure to update a service does not affect the updates of the other services
+        :param fn_update: function updating a single service
+        :param ecs_resources: services to update
+        :param state: state of the services after a successful update
+        :param error_message: message logged if a service could not be updated
+        :return: yields id and state of every successfully updated service
+        """
+        if len(ecs_resources) == 0:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(MAX_UPDATE_WORKERS, len(ecs_resources))) as executor:
+            futures = {executor.submit(fn_update, r): r for r in ecs_resources}
+            for future in as_completed(futures):
+                ecs_resource = futures[future]
+                try:
+                    future.result()
+                    yield ecs_resource.id, state
+                except Exception as ex:
+                    self._logger.error(error_message, "service", ecs_resource.arn, str(ex))
+
     # noinspection PyMethodMayBeStatic
     def stop_instances(self, kwargs):
 
         self._init_scheduler(kwargs)
-        methods = ["update_service",
-                   "tag_resource",
-                   "untag_resource"]
-
-        client = get_client_with_retries("ecs", methods, context=self._context, session=self._session, region=self._region)
 
+        self._init_tags()
         stopped_instances = kwargs["stopped_instances"]
-        try:
-            for ecs_resource in stopped_instances:
-            
-                args = {"cluster": ecs_resource.cluster_arn ,"service":ecs_resource.arn, "desiredCount":0}
-                
-                client.update_service_with_retries(**args)
-                self._tag_stopped_resource(client, ecs_resource)
-                yield ecs_resource.id, InstanceSchedule.STATE_STOPPED
-        except Exception as ex:
-            self._logger.error(ERR_STOPPING_INSTANCE, "cluster" if ecs_resource.is_cluster else "instance",
-                                  ecs_resource.arn, str(ex))
-
+        for inst_id, state in self._update_services(self._stop_service, stopped_instances,
+                                                    InstanceSchedule.STATE_STOPPED, ERR_STOPPING_INSTANCE):
+            yield inst_id, state
 
     # noinspection PyMethodMayBeStatic
     def start_instances(self, kwargs):
         self._init_scheduler(kwargs)
 
-        methods = ["update_service",
-                   "start_db_cluster",
-                   "tag_resource",
-                   "untag_resource"]
-
-        client = get_client_with_retries("ecs", methods, context=self._context, session=self._session, region=self._region)
-
+        self._init_tags()
         started_instances = kwargs["started_instances"]
-        try:
-            for ecs_resource in started_instances:
-               
-                args = {"cluster": ecs_resource.cluster_arn ,"service":ecs_resource.arn, "desiredCount": int(ecs_resource.tags['ScheduledLastDesiredCount'])}
-                client.update_service_with_retries(**args)
-                
-                self._tag_started_instances(client, ecs_resource)
-                yield ecs_resource.id, InstanceSchedule.STATE_RUNNING
-        except Exception as ex:
-                self._logger.error(ERR_STARTING_INSTANCE, "cluster" if ecs_resource.is_cluster else "instance",
-                                  ecs_resource.arn, str(ex))
-                return
-        
+        for inst_id, state in self._update_services(self._start_service, started_instances,
+                                                    InstanceSchedule.STATE_RUNNING, ERR_STARTING_INSTANCE):
+            yield inst_id, state
@@ -18,7 +18,9 @@ import schedulers
 import re
 import copy
 
-from boto_retry import get_client_with_retries
+from cachetools import TTLCache
+
+from boto_retry import get_client_with_retries, paginate, PAGINATE_RETRY_CONFIG
 from configuration.instance_schedule import InstanceSchedule
 from configuration.running_period import RunningPeriod
 from configuration.scheduler_config_builder import SchedulerConfigBuilder
@@ -50,6 +52,11 @@ WARN_RDS_TAG_VALUE = "Tag value \"{}\" for tag \"{}\" changed to \"{}\" because
                     "in RDS tag values. The value can only contain only the set of Unicode letters, digits, " \
                      "white-space, '_', '.', '/', '=', '+', '-'"
 
+# tagged resources are cached at module level so they are re-used by warm Lambda invocations, the time to live is
+# kept below the shortest scheduler interval (1 minute) so every scheduling run sees the current tags
+TAG_CACHE_TTL = 50
+_TAG_CACHE = TTLCache(maxsize=32, ttl=TAG_CACHE_TTL)
+
 MAINTENANCE_SCHEDULE_NAME = "RDS preferred Maintenance Window Schedule"
 MAINTENANCE_PERIOD_NAME = "RDS preferred Maintenance Window Period"
 
@@ -93,34 +100,31 @@ class RdsService:
     @property
     def rds_resource_tags(self):
 
+        cache_key = (self._account, self._region, self._tagname)
+        if self._instance_tags is None:
+            self._instance_tags = _TAG_CACHE.get(cache_key)
+
         if self._instance_tags is None:
             tag_client = get_client_with_retries("resourcegroupstaggingapi",
-                                                 methods=["get_resources"],
+                                                 methods=[],
                                                  session=self._session,
                                                  context=self._context,
-                                                 region=self._region)
+                                                 region=self._region,
+                                                 config=PAGINATE_RETRY_CONFIG)
 
             args = {
                 "TagFilters": [{"Key": self._tagname}],
-                "ResourcesPerPage": 50,
                 "ResourceTypeFilters": ["rds:db", "rds:cluster"]
             }
 
             self._instance_tags = {}
 
-            while True:
-
-                resp = tag_client.get_resources_with_retries(**args)
+            for resource in paginate(tag_client, "get_resources", "ResourceTagMappingList", **args):
+                self._instance_tags[resource["ResourceARN"]] = {tag["Key"]: tag["Value"]
+                                                                for tag in resource.get("Tags", {})
+                                                                if tag["Key"] in ["Name", self._tagname]}
 
-                for resource in resp.get("ResourceTagMappingList", []):
-                    self._instance_tags[resource["ResourceARN"]] = {tag["Key"]: tag["Value"]
-                                                                    for tag in resource.get("Tags", {})
-                                                                    if tag["Key"] in ["Name", self._tagname]}
-
-                if resp.get("PaginationToken", "") != "":
-                    args["PaginationToken"] = resp["PaginationToken"]
-                else:
-                    break
+            _TAG_CACHE[cache_key] = self._instance_tags
 
         return self._instance_tags
 
@@ -331,11 +335,8 @@ class RdsService:
                 resp = client.describe_db_snapshots_with_retries(DBSnapshotIdentifier=name, SnapshotType="manual")
                 snapshot = resp.get("DBSnapshots", None)
                 return snapshot is not None
-            except Exception as ex:
-                if type(ex).__name__ == "DBSnapshotNotFoundFault":
-                    return False
-                else:
-                    raise ex
+            except client.exceptions.DBSnapshotNotFoundFault:
+                return False
 
         args = {
             "DBInstanceIdentifier": inst.id
@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def clear_rds_tag_cache():
+    # the cache of tagged rds resources is module level and would keep its entries between tests
+    from schedulers import rds_service
+    rds_service._TAG_CACHE.clear()
+    yield
+    rds_service._TAG_CACHE.clear()
@@ -0,0 +1,355 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+import os
+
+mock.patch.dict(os.environ, {'MAINTENANCE_WINDOW_TABLE': 'test_table'}).start()
+
+from botocore.awsrequest import AWSResponse
+
+from boto_retry import PAGINATE_RETRY_CONFIG
+import schedulers
+from schedulers import EcsService
+from schedulers import ecs_service as ecs_service_module
+
+
+def test_describe_in_batches_services(mocker):
+    services = ["arn:aws:ecs:us-east-1:111111111111:service/cluster-1/service-{}".format(i) for i in range(25)]
+    describe_fn = mocker.MagicMock(side_effect=lambda **args: {"services": [{"serviceArn": s} for s in args["services"]]})
+
+    ecs_service = EcsService()
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ecs_service._describe_executor = executor
+        response = ecs_service._describe_in_batches(describe_fn, "services", services, 10, cluster="cluster-1")
+
+    assert describe_fn.call_count == 3
+    assert sorted(len(c[1]["services"]) for c in describe_fn.call_args_list) == [5, 10, 10]
+    assert all(c[1]["cluster"] == "cluster-1" for c in describe_fn.call_args_list)
+    assert [s["serviceArn"] for s in response] == services
+
+
+def test_describe_in_batches_single_batch(mocker):
+    clusters = ["arn:aws:ecs:us-east-1:111111111111:cluster/cluster-{}".format(i) for i in range(100)]
+    describe_fn = mocker.MagicMock(return_value={"clusters": [{"clusterArn": c} for c in clusters]})
+    ecs_service = EcsService()
+    ecs_service._describe_executor = mocker.MagicMock()
+
+    response = ecs_service._describe_in_batches(describe_fn, "clusters", clusters, 100, include=["TAGS"])
+
+    describe_fn.assert_called_once_with(clusters=clusters, include=["TAGS"])
+    ecs_service._describe_executor.map.assert_not_called()
+    assert len(response) == 100
+
+
+def test_describe_in_batches_empty(mocker):
+    describe_fn = mocker.MagicMock()
+
+    response = EcsService()._describe_in_batches(describe_fn, "clusters", [], 100)
+
+    assert response == []
+    describe_fn.assert_not_called()
+
+
+def test_validate_ecs_tag_values(mocker):
+    ecs_service = EcsService()
+    mocker.patch.object(ecs_service, '_logger')
+    tags = [{"key": "State", "value": "stopped\nby (scheduler)"}, {"key": "Name", "value": "web-1"}]
+
+    result = ecs_service._validate_ecs_tag_values(tags)
+
+    assert result == [{"key": "State", "value": "stopped by  scheduler "}, {"key": "Name", "value": "web-1"}]
+    assert tags[0]["value"] == "stopped\nby (scheduler)"
+    ecs_service._logger.warning.assert_called_once()
+
+
+def test_update_services_continues_after_failure(mocker):
+    ecs_service = EcsService()
+    mocker.patch.object(ecs_service, '_logger')
+    resources = [mocker.MagicMock(id="service-{}".format(i), arn="arn-{}".format(i)) for i in range(3)]
+
+    def update(ecs_resource):
+        if ecs_resource.id == "service-1":
+            raise Exception("update failed")
+
+    result = list(ecs_service._update_services(update, resources, "stopped", "{} {} {}"))
+
+    assert sorted(result) == [("service-0", "stopped"), ("service-2", "stopped")]
+    ecs_service._logger.error.assert_called_once()
+
+
+def test_tag_stopped_resource(mocker):
+    ecs_service = EcsService()
+    mocker.patch.object(ecs_service, '_logger')
+    ecs_service._config = mocker.MagicMock(started_tags=[{"Key": "State", "Value": "started"},
+                                                         {"Key": "StartedBy", "Value": "scheduler"}],
+                                           stopped_tags=[{"Key": "State", "Value": "stopped"}])
+    ecs_service._init_tags()
+    client = mocker.patch.object(ecs_service, '_ecs')
+    ecs_resource = mocker.MagicMock(arn="arn-1", desired_count=3)
+
+    ecs_service._tag_stopped_resource(ecs_resource)
+
+    client.untag_resource.assert_called_once_with(resourceArn="arn-1", tagKeys=["StartedBy"])
+    client.tag_resource.assert_called_once_with(
+        resourceArn="arn-1", tags=[{"key": "State", "value": "stopped"},
+                                   {"key": "ScheduledLastDesiredCount", "value": "3"}])
+
+
+def test_init_scheduler_does_not_change_config_tags(mocker):
+    ecs_service = EcsService()
+    mocker.patch("schedulers.ecs_service.get_client_with_retries")
+    config = mocker.MagicMock(tag_name="Schedule",
+                              started_tags=[{"Key": "State", "Value": "started"}],
+                              stopped_tags=[{"Key": "State", "Value": "stopped"}])
+
+    ecs_service._init_scheduler({schedulers.PARAM_CONFIG: config, schedulers.PARAM_REGION: "us-east-1"})
+    ecs_service._init_tags()
+
+    assert config.started_tags == [{"Key": "State", "Value": "started"}]
+    assert config.stopped_tags == [{"Key": "State", "Value": "stopped"}]
+    assert ecs_service._stop_tags == [{"key": "State", "value": "stopped"}]
+
+
+def test_get_tags():
+    assert EcsService.get_tags({"tags": [{"key": "Schedule", "value": "office-hours"}]}) == {"Schedule": "office-hours"}
+    assert EcsService.get_tags({}) == {}
+
+
+def test_select_resource_data():
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    service = {
+        "serviceArn": "arn:aws:ecs:us-east-1:111111111111:service/cluster-1/web",
+        "clusterArn": "arn:aws:ecs:us-east-1:111111111111:cluster/cluster-1",
+        "status": "ACTIVE",
+        "runningCount": 2,
+        "desiredCount": 2,
+        "launchType": "FARGATE",
+        "tags": [{"key": "Schedule", "value": "office-hours"}]
+    }
+
+    data = ecs_service._select_resource_data(service)
+
+    assert data["id"] == service["serviceArn"]
+    assert data["schedule_name"] == "office-hours"
+    assert data["current_state"] == "running"
+    assert data["is_terminated"] is False
+    assert data["service_stop"] is False
+    assert ecs_service._select_resource_data(service)["tags"] is not data["tags"]
+
+
+def test_get_all_services_only_describes_tagged_services(mocker):
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    arn = "arn:aws:ecs:us-east-1:111111111111:service/cluster-1/web"
+    tagged_services = {arn: [{"key": "Schedule", "value": "office-hours"}]}
+    mocker.patch.object(ecs_service, '_ecs')
+    describe = mocker.patch.object(ecs_service, '_describe_in_batches', return_value=[
+        {"serviceArn": arn, "clusterArn": "cluster-1", "status": "ACTIVE", "runningCount": 1, "desiredCount": 1,
+         "launchType": "EC2"},
+        {"serviceArn": arn, "clusterArn": "cluster-1", "status": "INACTIVE", "runningCount": 0, "desiredCount": 0,
+         "launchType": "EC2"}])
+
+    services = ecs_service.get_all_services("cluster-1", tagged_services)
+
+    assert describe.call_args[0][2] == [arn]
+    assert len(services) == 1
+    assert services[0]["schedule_name"] == "office-hours"
+
+
+def test_services_by_cluster():
+    services = {
+        "arn:aws:ecs:us-east-1:111111111111:service/cluster-1/web": [],
+        "arn:aws:ecs:us-east-1:111111111111:service/cluster-2/api": [],
+        "arn:aws:ecs:us-east-1:111111111111:service/legacy": []
+    }
+
+    result = EcsService._services_by_cluster(services)
+
+    assert sorted(result) == ["cluster-1", "cluster-2"]
+    assert list(result["cluster-1"]) == ["arn:aws:ecs:us-east-1:111111111111:service/cluster-1/web"]
+
+
+def test_get_schedulable_instances_keeps_services_of_all_clusters(mocker):
+    ecs_service = EcsService()
+    mocker.patch.object(ecs_service, '_init_scheduler')
+    mocker.patch.object(ecs_service, '_async_fetch_enabled', return_value=False)
+    mocker.patch.object(ecs_service, 'get_schedulable_ecs_clusters', return_value={
+        "clusters_with_schedule": [], "clusters_without_schedule": ["cluster-1", "cluster-2"]})
+    mocker.patch.object(ecs_service, 'get_schedulable_ecs_services', side_effect=lambda c: [{"id": c + "-service"}])
+
+    services = ecs_service.get_schedulable_instances({"region": "us-east-1"})
+
+    assert services == [{"id": "cluster-1-service"}, {"id": "cluster-2-service"}]
+
+
+def test_get_schedulable_instances_without_clusters(mocker):
+    ecs_service = EcsService()
+    mocker.patch.object(ecs_service, '_init_scheduler')
+    mocker.patch.object(ecs_service, 'get_schedulable_ecs_clusters', return_value={
+        "clusters_with_schedule": [], "clusters_without_schedule": []})
+    tagged = mocker.patch.object(ecs_service, 'get_tagged_ecs_services')
+
+    assert ecs_service.get_schedulable_instances({"region": "us-east-1"}) == []
+    tagged.assert_not_called()
+
+
+def test_get_schedulable_ecs_services_describes_listed_pages(mocker):
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    pages = [{"serviceArns": ["arn:aws:ecs:us-east-1:111111111111:service/pipeline/service-{}".format(i)
+                              for i in range(p * 100, min(p * 100 + 100, 125))]} for p in range(2)]
+    client = mocker.patch.object(ecs_service, '_ecs')
+    client.get_paginator.return_value.paginate.return_value = pages
+    client.describe_services.side_effect = lambda **args: {"services": [
+        {"serviceArn": s, "clusterArn": "pipeline", "status": "ACTIVE", "runningCount": 1, "desiredCount": 1,
+         "launchType": "EC2", "tags": [{"key": "Schedule", "value": "office-hours"}]} for s in args["services"]]}
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        ecs_service._describe_executor = executor
+        services = ecs_service.get_schedulable_ecs_services("pipeline")
+
+    assert client.describe_services.call_count == 13
+    assert all(len(c[1]["services"]) <= 10 for c in client.describe_services.call_args_list)
+    assert sorted(s["id"] for s in services) == sorted(pages[0]["serviceArns"] + pages[1]["serviceArns"])
+
+
+def test_get_schedulable_ecs_services_single_batch_in_calling_thread(mocker):
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    ecs_service._describe_executor = mocker.MagicMock()
+    arns = ["arn:aws:ecs:us-east-1:111111111111:service/single/service-{}".format(i) for i in range(10)]
+    client = mocker.patch.object(ecs_service, '_ecs')
+    client.get_paginator.return_value.paginate.return_value = [{"serviceArns": arns}]
+    client.describe_services.return_value = {"services": [
+        {"serviceArn": s, "clusterArn": "single", "status": "ACTIVE", "runningCount": 0, "desiredCount": 0,
+         "launchType": "FARGATE"} for s in arns]}
+
+    services = ecs_service.get_schedulable_ecs_services("single")
+
+    client.describe_services.assert_called_once_with(cluster="single", services=arns, include=['TAGS'])
+    ecs_service._describe_executor.submit.assert_not_called()
+    assert len(services) == 10
+
+
+def test_get_tagged_ecs_services_uses_retry_config(mocker):
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    get_client = mocker.patch("schedulers.ecs_service.get_client_with_retries")
+    mocker.patch("schedulers.ecs_service.paginate", return_value=[
+        {"ResourceARN": "arn-1", "Tags": [{"Key": "Schedule", "Value": "office-hours"}]}])
+
+    services = ecs_service.get_tagged_ecs_services("us-east-1")
+
+    assert get_client.call_args[1]["config"] is PAGINATE_RETRY_CONFIG
+    assert services == {"arn-1": [{"key": "Schedule", "value": "office-hours"}]}
+
+
+def test_async_fetch_is_opt_in(mocker):
+    mocker.patch("schedulers.ecs_service.aioboto3", mocker.MagicMock())
+    mocker.patch.dict(os.environ, {}, clear=False)
+    os.environ.pop("ECS_ASYNC_FETCH", None)
+    assert not EcsService._async_fetch_enabled()
+
+    mocker.patch.dict(os.environ, {"ECS_ASYNC_FETCH": "true"})
+    assert EcsService._async_fetch_enabled()
+
+
+class _AsyncPages:
+
+    def __init__(self, pages):
+        self._pages = iter(pages)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._pages)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+def test_afetch_cluster_selects_services_as_threaded_fetch(mocker):
+    ecs_service = EcsService()
+    ecs_service._tagname = "Schedule"
+    arns = ["arn:aws:ecs:us-east-1:111111111111:service/async/service-{}".format(i) for i in range(12)]
+
+    async def describe_services(**args):
+        return {"services": [
+            {"serviceArn": s, "clusterArn": "async", "status": "ACTIVE", "runningCount": 1, "desiredCount": 1,
+             "launchType": "EC2", "tags": [{"key": "Schedule", "value": "office-hours"}] if s == arns[0] else []}
+            for s in args["services"]]}
+
+    client = mocker.MagicMock(describe_services=mocker.MagicMock(side_effect=describe_services))
+    client.get_paginator.return_value.paginate.return_value = _AsyncPages([{"serviceArns": arns}])
+
+    services = asyncio.run(ecs_service._afetch_cluster(client, "async", asyncio.Semaphore(4)))
+
+    assert client.describe_services.call_count == 2
+    assert [s["service_stop"] for s in services] == [False] + [True] * 11
+    assert services[0]["schedule_name"] == "office-hours"
+
+
+def test_update_services_retries_concurrent_throttled_calls(mocker):
+    mocker.patch.dict(os.environ, {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test"})
+    # the retry delays and the client side rate limiting of the adaptive retry mode are not waited for
+    mocker.patch("botocore.endpoint.time.sleep")
+    mocker.patch("botocore.retries.bucket.TokenBucket.acquire", return_value=True)
+    ecs_service = EcsService()
+    config = mocker.MagicMock(tag_name="Schedule", started_tags=[], stopped_tags=[])
+    ecs_service._init_scheduler({schedulers.PARAM_CONFIG: config, schedulers.PARAM_REGION: "us-east-1"})
+    ecs_service._logger = mocker.MagicMock()
+    attempts = {}
+    lock = threading.Lock()
+
+    # every update_service call is throttled twice before it succeeds
+    def send(request, **_):
+        service = json.loads(request.body)["service"]
+        with lock:
+            attempts[service] = attempts.get(service, 0) + 1
+            throttled = attempts[service] <= 2
+        if throttled:
+            body = json.dumps({"__type": "ThrottlingException", "message": "Rate exceeded"}).encode()
+            return AWSResponse(request.url, 400, {}, mocker.MagicMock(content=body, stream=lambda: [body]))
+        body = json.dumps({"service": {"serviceArn": service}}).encode()
+        return AWSResponse(request.url, 200, {}, mocker.MagicMock(content=body, stream=lambda: [body]))
+
+    ecs_service._ecs.meta.events.register("before-send.ecs.UpdateService", send)
+    mocker.patch.object(ecs_service, '_tag_stopped_resource')
+    resources = [mocker.MagicMock(id="service-{}".format(i), arn="service-{}".format(i), cluster_arn="cluster-1")
+                 for i in range(32)]
+
+    result = list(ecs_service._update_services(ecs_service._stop_service, resources, "stopped", "{} {} {}"))
+
+    # calls are only retried by botocore, not by the retry methods sharing one wait strategy between threads
+    assert not hasattr(ecs_service._ecs, "update_service_with_retries")
+    assert len(result) == 32
+    assert set(attempts.values()) == {3}
+    ecs_service._logger.error.assert_not_called()
+
+
+def test_throttled_call_is_not_retried_after_botocore_attempts(mocker):
+    mocker.patch.dict(os.environ, {"AWS_ACCESS_KEY_ID": "test", "AWS_SECRET_ACCESS_KEY": "test"})
+    mocker.patch("botocore.endpoint.time.sleep")
+    mocker.patch("botocore.retries.bucket.TokenBucket.acquire", return_value=True)
+    ecs_service = EcsService()
+    config = mocker.MagicMock(tag_name="Schedule", started_tags=[], stopped_tags=[])
+    ecs_service._init_scheduler({schedulers.PARAM_CONFIG: config, schedulers.PARAM_REGION: "us-east-1"})
+    ecs_service._logger = mocker.MagicMock()
+    send = mocker.MagicMock()
+    body = json.dumps({"__type": "ThrottlingException", "message": "Rate exceeded"}).encode()
+    send.side_effect = lambda request, **_: AWSResponse(request.url, 400, {},
+                                                        mocker.MagicMock(content=body, stream=lambda: [body]))
+    ecs_service._ecs.meta.events.register("before-send.ecs.UpdateService", send)
+    mocker.patch.object(ecs_service, '_tag_stopped_resource')
+    resource = mocker.MagicMock(id="service-1", arn="service-1", cluster_arn="cluster-1")
+
+    result = list(ecs_service._update_services(ecs_service._stop_service, [resource], "stopped", "{} {} {}"))
+
+    assert result == []
+    assert send.call_count == ecs_service_module.ECS_MAX_ATTEMPTS
+    ecs_service._logger.error.assert_called_once()
@@ -0,0 +1,67 @@
+from unittest import mock
+import os
+
+mock.patch.dict(os.environ, {'MAINTENANCE_WINDOW_TABLE': 'test_table'}).start()
+
+from cachetools import TTLCache
+
+import schedulers
+from schedulers import RdsService
+from schedulers import rds_service as rds_service_module
+
+TAGGED_RESOURCES = [{"ResourceARN": "arn:aws:rds:us-east-1:111111111111:db:db-1",
+                     "Tags": [{"Key": "Schedule", "Value": "office-hours"}, {"Key": "Owner", "Value": "team"}]}]
+
+
+def init_scheduler(rds_service, mocker, account="111111111111", region="us-east-1"):
+    rds_service._init_scheduler({schedulers.PARAM_ACCOUNT: account,
+                                 schedulers.PARAM_REGION: region,
+                                 schedulers.PARAM_CONFIG: mocker.MagicMock(tag_name="Schedule")})
+
+
+def test_rds_resource_tags_cached_for_account_region_and_tag_name(mocker):
+    mocker.patch("schedulers.rds_service.get_client_with_retries")
+    paginate = mocker.patch("schedulers.rds_service.paginate", return_value=TAGGED_RESOURCES)
+    rds_service = RdsService()
+    init_scheduler(rds_service, mocker)
+
+    tags = rds_service.rds_resource_tags
+
+    # _init_scheduler resets the tags of the instance, the tags are taken from the cache
+    init_scheduler(rds_service, mocker)
+    assert rds_service.rds_resource_tags == tags == {TAGGED_RESOURCES[0]["ResourceARN"]: {"Schedule": "office-hours"}}
+    assert paginate.call_count == 1
+
+
+def test_rds_resource_tags_not_cached_for_other_account_or_region(mocker):
+    mocker.patch("schedulers.rds_service.get_client_with_retries")
+    paginate = mocker.patch("schedulers.rds_service.paginate", return_value=TAGGED_RESOURCES)
+    rds_service = RdsService()
+
+    for account, region in [("111111111111", "us-east-1"), ("222222222222", "us-east-1"),
+                            ("111111111111", "eu-west-1")]:
+        init_scheduler(rds_service, mocker, account, region)
+        assert len(rds_service.rds_resource_tags) == 1
+
+    assert paginate.call_count == 3
+
+
+def test_rds_resource_tags_expired_cache_entry(mocker):
+    now = [0]
+    mocker.patch.object(rds_service_module, "_TAG_CACHE",
+                        TTLCache(maxsize=32, ttl=rds_service_module.TAG_CACHE_TTL, timer=lambda: now[0]))
+    mocker.patch("schedulers.rds_service.get_client_with_retries")
+    paginate = mocker.patch("schedulers.rds_service.paginate", return_value=TAGGED_RESOURCES)
+    rds_service = RdsService()
+    init_scheduler(rds_service, mocker)
+    assert len(rds_service.rds_resource_tags) == 1
+
+    now[0] = rds_service_module.TAG_CACHE_TTL - 1
+    init_scheduler(rds_service, mocker)
+    assert len(rds_service.rds_resource_tags) == 1
+    assert paginate.call_count == 1
+
+    now[0] = rds_service_module.TAG_CACHE_TTL + 1
+    init_scheduler(rds_service, mocker)
+    assert len(rds_service.rds_resource_tags) == 1
+    assert paginate.call_count == 2
@@ -12,6 +12,7 @@
 ######################################################################################################################
 
 import os
+import threading
 import time
 from datetime import datetime
 
@@ -58,6 +59,7 @@ class Logger:
         self._loggroup = loggroup if loggroup is not None else get_loggroup(self._context)
 
         self._sns = None
+        self._lock = threading.RLock()
 
     def __enter__(self):
         """
@@ -78,25 +80,27 @@ class Logger:
 
     def _emit(self, level, msg, *args):
 
-        s = msg if len(args) == 0 else msg.format(*args)
-        t = time.time()
-        dt = datetime.fromtimestamp(t)
-        s = LOG_FORMAT.format(dt.year, dt.month, dt.day, dt.hour, dt.minute,
-                              dt.second, str(dt.microsecond)[0:3], level, s)
+        # the logger can be used by multiple threads, e.g. when starting or stopping resources in parallel
+        with self._lock:
+            s = msg if len(args) == 0 else msg.format(*args)
+            t = time.time()
+            dt = datetime.fromtimestamp(t)
+            s = LOG_FORMAT.format(dt.year, dt.month, dt.day, dt.hour, dt.minute,
+                                  dt.second, str(dt.microsecond)[0:3], level, s)
 
-        if self._cached_size + (len(s) + LOG_ENTRY_ADDITIONAL) > LOG_MAX_BATCH_SIZE:
-            self.flush()
+            if self._cached_size + (len(s) + LOG_ENTRY_ADDITIONAL) > LOG_MAX_BATCH_SIZE:
+                self.flush()
 
-        self._cached_size += len(s) + LOG_ENTRY_ADDITIONAL
+            self._cached_size += len(s) + LOG_ENTRY_ADDITIONAL
 
-        if self._context is None and str(os.getenv(ENV_SUPPRESS_LOG_STDOUT, False)).lower() != "true":
-            print("> " + s)
-        self._buffer.append((int(t * 1000), s))
+            if self._context is None and str(os.getenv(ENV_SUPPRESS_LOG_STDOUT, False)).lower() != "true":
+                print("> " + s)
+            self._buffer.append((int(t * 1000), s))
 
-        if len(self._buffer) >= self._buffer_size:
-            self.flush()
+            if len(self._buffer) >= self._buffer_size:
+                self.flush()
 
-        return s
+            return s
 
     @property
     def debug_enabled(self):
@@ -219,38 +223,39 @@ class Logger:
                         return None
                     time.sleep(1)
 
-        if len(self._buffer) == 0:
-            return
+        with self._lock:
+            if len(self._buffer) == 0:
+                return
 
-        put_event_args = {
-            "logGroupName": self._loggroup,
-            "logStreamName": self._logstream,
-            "logEvents": [{"timestamp": r[0], "message": r[1]} for r in self._buffer]
-        }
+            put_event_args = {
+                "logGroupName": self._loggroup,
+                "logStreamName": self._logstream,
+                "logEvents": [{"timestamp": r[0], "message": r[1]} for r in self._buffer]
+            }
 
-        next_token = None
-        try:
-            retries = 0
-            while True:
-                next_token = get_next_log_token()
-                if next_token is not None:
-                    put_event_args["sequenceToken"] = next_token
-                try:
-                    log_event_response = self.client.put_log_events(**put_event_args)
-                    self._log_sequence_token = log_event_response['nextSequenceToken']
-                    self._buffer = []
-                    self._cached_size = 0
-                    return
-                except Exception as ex:
-                    retries += 1
-                    if retries > 5:
-                        raise ex
-                    time.sleep(2)
+            next_token = None
+            try:
+                retries = 0
+                while True:
                     next_token = get_next_log_token()
                     if next_token is not None:
                         put_event_args["sequenceToken"] = next_token
-
-        except Exception as ex:
-            print("Error writing to logstream {} with token {} ({})".format(self._logstream, next_token, str(ex)))
-            for entry in self._buffer:
-                print (entry)
+                    try:
+                        log_event_response = self.client.put_log_events(**put_event_args)
+                        self._log_sequence_token = log_event_response['nextSequenceToken']
+                        self._buffer = []
+                        self._cached_size = 0
+                        return
+                    except Exception as ex:
+                        retries += 1
+                        if retries > 5:
+                            raise ex
+                        time.sleep(2)
+                        next_token = get_next_log_token()
+                        if next_token is not None:
+                            put_event_args["sequenceToken"] = next_token
+
+            except Exception as ex:
+                print("Error writing to logstream {} with token {} ({})".format(self._logstream, next_token, str(ex)))
+                for entry in self._buffer:
+                    print (entry)